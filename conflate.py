@@ -0,0 +1,68 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Slot:
+    """종목별 최신 체결틱과 마지막 전달 이후 누적값"""
+    __slots__ = ("code", "price", "sell", "buy", "volume", "high", "low", "count", "dirty")
+
+    def __init__(self, code):
+        self.code = code
+        self.dirty = False
+
+
+class TickConflator:
+    """체결틱 병합 큐
+
+    종목별 슬롯에 최신 가격만 남기고 거래량, 고가, 저가, 틱수는 전달 전까지 누적한다.
+    drain()은 그 사이 갱신된 종목만 도착순으로 한번씩 돌려주므로 한 주기의 처리량은
+    틱 수가 아니라 종목 수에 비례한다.
+    """
+
+    def __init__(self):
+        self.slots = {}   # symbol id -> Slot
+        self.dirty = []   # 갱신된 symbol id (도착순)
+        self.ticks = 0
+        self.batches = 0
+
+    def __len__(self):
+        return len(self.dirty)
+
+    def push(self, symbol_id, code, price, sell, buy, volume):
+        """체결틱 추가"""
+        slot = self.slots.get(symbol_id)
+        if slot is None:
+            slot = self.slots[symbol_id] = Slot(code)
+
+        if slot.dirty:
+            slot.volume += volume
+            if price > slot.high:
+                slot.high = price
+            if price < slot.low:
+                slot.low = price
+            slot.count += 1
+        else:
+            slot.dirty = True
+            slot.volume = volume
+            slot.high = price
+            slot.low = price
+            slot.count = 1
+            self.dirty.append(symbol_id)
+
+        slot.price = price
+        slot.sell = sell
+        slot.buy = buy
+        self.ticks += 1
+
+    def drain(self):
+        """갱신된 종목의 최신 틱 목록을 반환하고 슬롯을 비운다"""
+        batch = []
+        for symbol_id in self.dirty:
+            slot = self.slots[symbol_id]
+            slot.dirty = False
+            batch.append(dict(code=slot.code, price=slot.price, sell=slot.sell, buy=slot.buy, volume=slot.volume,
+                              high=slot.high, low=slot.low, count=slot.count))
+        self.dirty = []
+        self.batches += 1
+        return batch
@@ -1,13 +1,98 @@
+import calendar
 import logging
 import sqlite3
+from datetime import datetime
+from sys import intern
 
 logger = logging.getLogger(__name__)
 
+DB_PATH = "data/trading.db"
+
+# 종목 차원 테이블: 종목코드, 종목명은 한번만 저장
+# market 이후 컬럼은 종목마스터(master.SymbolMaster)가 하루 한번 갱신
+SYMBOL_DDL = """
+CREATE TABLE IF NOT EXISTS SYMBOL (
+  id INTEGER PRIMARY KEY
+  , code TEXT NOT NULL UNIQUE
+  , name TEXT
+  , market TEXT
+  , listed_cnt INTEGER
+  , last_price INTEGER
+  , upd_date INTEGER
+)
+"""
+
+# 월별 주문결과 파티션 (ORD_YYYYMM)
+# 시각은 현지 시각을 UTC로 간주한 epoch 초, 값이 없으면 NULL
+ORD_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+  ord_no INTEGER NOT NULL
+  , symbol_id INTEGER NOT NULL REFERENCES SYMBOL (id)
+  , ord_type INTEGER NOT NULL
+  , contract_ts INTEGER
+  , contract_no INTEGER
+  , price INTEGER
+  , qty INTEGER
+  , charge INTEGER
+  , tax INTEGER
+  , ts INTEGER NOT NULL
+)
+"""
+ORD_INDEX_DDL = [
+    "CREATE INDEX IF NOT EXISTS idx_{table}_01 ON {table} (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_{table}_02 ON {table} (symbol_id, ts)",
+]
+
+
+def to_ts(dt):
+    """datetime -> 정수 시각"""
+    return calendar.timegm(dt.timetuple())
+
+
+def from_ts(ts):
+    """정수 시각 -> datetime"""
+    return datetime.utcfromtimestamp(ts)
+
+
+def to_int(value):
+    """'' 또는 None 은 NULL, 나머지는 정수"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return int(value) if value else None
+
+
+def normalize_code(code):
+    """체결통보 종목코드(A005930)를 실시간 종목코드(005930)로 변환"""
+    code = code.strip()
+    return code[1:] if code.startswith('A') else code
+
+
+def partition_name(dt):
+    return "ORD_%04d%02d" % (dt.year, dt.month)
+
+
+def partition_range(start, end):
+    """start ~ end 구간에 걸친 파티션 이름 목록"""
+    year, month = start.year, start.month
+    names = []
+    while (year, month) <= (end.year, end.month):
+        names.append("ORD_%04d%02d" % (year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return names
+
 
 class Database:
-    def __init__(self):
-        self.db = sqlite3.connect("data/trading.db")
+    def __init__(self, path=DB_PATH):
+        self.db = sqlite3.connect(path)
         self.cursor = self.db.cursor()
+        self.cursor.execute(SYMBOL_DDL)
+
+        # 종목코드 -> symbol id
+        self.symbols = self.load_symbol_ids()
+        self.partitions = set(name for name, in self.cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'ORD_[0-9]*'"))
+        self.db.commit()
         logger.info("db connection init")
 
     def __del__(self):
@@ -25,26 +110,107 @@ class Database:
         self.cursor.execute("UPDATE condition_stock SET use_yn = 'N', mod_dts = datetime('now', 'localtime') WHERE stock_code = ?", (stock_code,))
         self.db.commit()
 
-    def insert_ord_data(self, data):
-        """주문결과 저장"""
-        sql = """
-        INSERT INTO ORD (
-          ord_no
-          , stock_code
-          , stock_name
-          , ord_type
-          , contract_time
-          , contract_no
-          , price
-          , qty
-          , charge
-          , tax
-        ) VALUES (
-          ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-        )
+    def load_symbol_ids(self):
+        """종목코드 -> symbol id (종목코드는 intern 해서 같은 문자열 객체를 공유)"""
+        return dict((intern(code), symbol_id) for code, symbol_id in self.cursor.execute("SELECT code, id FROM SYMBOL"))
+
+    def symbol_id(self, code, name=None, commit=True):
+        """종목코드의 symbol id, 없으면 추가
+
+        commit: False 면 호출하는 쪽에서 commit (insert_ord 등 트랜잭션 안에서 호출할 때)
+        """
+        code = intern(normalize_code(code))
+        symbol_id = self.symbols.get(code)
+        if symbol_id is None:
+            self.cursor.execute("INSERT OR IGNORE INTO SYMBOL (code, name) VALUES (?, ?)",
+                                (code, name.strip() if name else None))
+            symbol_id = self.cursor.execute("SELECT id FROM SYMBOL WHERE code = ?", (code,)).fetchone()[0]
+            if commit:
+                self.db.commit()
+            self.symbols[code] = symbol_id
+        return symbol_id
+
+    def upsert_symbols(self, rows):
+        """종목마스터 저장
+
+        rows: (code, name, market, listed_cnt, last_price, upd_date) 목록
         """
-        param = (data[1], data[3], data[6], data[14], data[15], data[16], data[17], data[18], data[24], data[25])
-        logger.debug("INSERT ORD: %s", param)
-        self.cursor.execute(sql, param)
+        self.cursor.executemany("INSERT OR IGNORE INTO SYMBOL (code) VALUES (?)", [(row[0],) for row in rows])
+        self.cursor.executemany("UPDATE SYMBOL SET name = ?, market = ?, listed_cnt = ?, last_price = ?, upd_date = ? "
+                                "WHERE code = ?", [row[1:] + row[:1] for row in rows])
         self.db.commit()
+        self.symbols = self.load_symbol_ids()
+
+    def select_symbols(self):
+        """종목마스터 전체 조회"""
+        return self.cursor.execute(
+            "SELECT id, code, name, market, listed_cnt, last_price, upd_date FROM SYMBOL ORDER BY id").fetchall()
+
+    def partition(self, dt):
+        """dt 가 속한 월 파티션 이름, 없으면 생성"""
+        table = partition_name(dt)
+        if table not in self.partitions:
+            self.cursor.execute(ORD_DDL.format(table=table))
+            for ddl in ORD_INDEX_DDL:
+                self.cursor.execute(ddl.format(table=table))
+            self.partitions.add(table)
+            logger.info("partition created: %s", table)
+        return table
+
+    def insert_ord(self, rows, commit=True):
+        """주문결과 저장
+
+        rows: (ord_no, stock_code, stock_name, ord_type, contract_time(HHMMSS), contract_no, price, qty, charge, tax,
+               time(datetime)) 목록
+        commit: False 면 호출하는 쪽에서 commit
+        """
+        params = {}
+        for ord_no, code, name, ord_type, contract_time, contract_no, price, qty, charge, tax, dt in rows:
+            contract_ts = None
+            contract_time = to_int(contract_time)
+            if contract_time is not None:
+                contract_ts = to_ts(dt.replace(hour=contract_time // 10000, minute=contract_time // 100 % 100,
+                                               second=contract_time % 100, microsecond=0))
+            param = (to_int(ord_no), self.symbol_id(code, name, commit=False), to_int(ord_type), contract_ts, to_int(contract_no),
+                     to_int(price), to_int(qty), to_int(charge), to_int(tax), to_ts(dt))
+            params.setdefault(self.partition(dt), []).append(param)
+
+        for table, param in params.items():
+            logger.debug("INSERT %s: %s", table, param)
+            self.cursor.executemany("INSERT INTO %s VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)" % table, param)
+        if commit:
+            self.db.commit()
+
+    def insert_ord_data(self, data):
+        """주문체결통보 저장"""
+        self.insert_ord([(data[1], data[3], data[6], data[14], data[15], data[16], data[17], data[18], data[24],
+                          data[25], datetime.now())])
+
+    def select_ord(self, start, end, code=None):
+        """start <= time < end 구간 주문결과 조회
+
+        구간에 걸친 월 파티션만 ts 인덱스로 조회한다.
+        """
+        tables = [table for table in partition_range(start, end) if table in self.partitions]
+        if not tables:
+            return []
+
+        where = "o.ts >= ? AND o.ts < ?"
+        param = [to_ts(start), to_ts(end)]
+        if code is not None:
+            symbol_id = self.symbols.get(normalize_code(code))
+            if symbol_id is None:
+                return []
+            where += " AND o.symbol_id = ?"
+            param.append(symbol_id)
+
+        sql = " UNION ALL ".join(
+            "SELECT o.ord_no, s.code, s.name, o.ord_type, o.contract_ts, o.contract_no, o.price, o.qty, o.charge, "
+            "o.tax, o.ts FROM %s o JOIN SYMBOL s ON s.id = o.symbol_id WHERE %s" % (table, where) for table in tables)
 
+        result = []
+        for row in self.cursor.execute(sql + " ORDER BY 11", param * len(tables)):
+            result.append(dict(ord_no="%07d" % row[0], stock_code=row[1], stock_name=row[2], ord_type=row[3],
+                               contract_time=from_ts(row[4]) if row[4] is not None else None, contract_no=row[5],
+                               price=row[6], qty=row[7], charge=row[8], tax=row[9], time=from_ts(row[10])))
+        return result
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""모의 시세 부하 생성기
+
+OnReceiveRealData(주식체결, 주식호가잔량), OnReceiveRealCondition 편입/이탈,
+OnReceiveChejanData 주문체결통보(부분체결 포함) 이벤트를 생성해서 대상 파이프라인에
+전달하고 처리량과 적체(backlog) 증가량을 측정한다.
+
+사용법
+python loadgen.py --symbols 50 --rate 10 --seconds 60 --profile u
+python loadgen.py --symbols 50 --rate 10 --seconds 60 --realtime
+python loadgen.py --target decode          # 전문 파싱만 측정
+"""
+import argparse
+import heapq
+import logging
+import math
+import random
+import time
+
+import code as CODE
+from database import Database
+from master import tick_size
+from trader import Trader
+
+logger = logging.getLogger(__name__)
+
+# 실시간 데이터 전문 FID 순서 (탭 구분)
+REAL_FID_LIST = {
+    "주식체결": ["20", "10", "11", "12", "27", "28", "15", "13", "14", "16", "17", "18", "25", "26", "29", "30", "31",
+             "32", "228", "311", "290", "691", "567", "568"],
+    "주식호가잔량": ["21"] + [str(fid) for fid in range(41, 51)] + [str(fid) for fid in range(61, 71)] +
+              [str(fid) for fid in range(81, 91)] + [str(fid) for fid in range(51, 61)] +
+              [str(fid) for fid in range(71, 81)] + [str(fid) for fid in range(91, 101)] +
+              ["121", "122", "125", "126", "23", "24", "128", "129", "138", "139", "200", "201", "238", "291", "292",
+               "293", "294", "295", "13", "299", "215", "216"],
+}
+
+# 주문체결통보 FID 리스트 (sGubun == "0")
+CHEJAN_FID_LIST = "9201;9203;9205;9001;912;913;302;900;901;902;903;904;905;906;907;908;909;910;911;10;27;28;914;915;" \
+                  "938;939;919;920;921;922;923"
+
+CONDITION_NAME = "LOADGEN"
+
+# 시간대별 부하 형태
+PROFILES = ("flat", "open", "close", "u")
+
+
+def signed(value, base):
+    """기준가 대비 부호를 붙인 값 (+상승, -하락)"""
+    if value > base:
+        return "+%d" % value
+    elif value < base:
+        return "-%d" % value
+    return "%d" % value
+
+
+class ReplayControl:
+    """QAxWidget 대신 대상 파이프라인에 전달하는 제어 객체
+
+    OnReceiveChejanData 처리중 호출되는 GetChejanData 에 현재 이벤트 값을 돌려주고
+    나머지 호출은 무시한다.
+    """
+
+    def __init__(self):
+        self.chejan = {}
+
+    def GetChejanData(self, fid):
+        return self.chejan.get(str(fid), "")
+
+    def SetRealReg(self, *args):
+        return 0
+
+    def SetRealRemove(self, *args):
+        pass
+
+    def SendOrder(self, *args):
+        return 0
+
+    def GetMasterLastPrice(self, code):
+        return "0"
+
+
+class Symbol:
+    """종목별 시세 상태"""
+
+    def __init__(self, code, name, price):
+        self.code = code
+        self.name = name
+        self.base = price
+        self.price = price
+        self.open = price
+        self.high = price
+        self.low = price
+        self.volume = 0
+        self.amount = 0
+
+    def step(self, rnd):
+        """한 틱 이동 후 체결량 반환"""
+        move = rnd.choice((-1, 0, 0, 1))
+        upper = self.base * 13 // 10
+        lower = self.base * 7 // 10
+        self.price = min(upper, max(lower, self.price + move * tick_size(self.price)))
+        self.high = max(self.high, self.price)
+        self.low = min(self.low, self.price)
+        qty = int(rnd.expovariate(1 / 50.0)) + 1
+        self.volume += qty
+        self.amount += qty * self.price
+        return qty
+
+
+class LoadGenerator:
+    """모의 이벤트 생성 및 파이프라인 부하 측정
+
+    :param symbols: 종목수
+    :param rate: 종목당 초당 체결틱 수 (평상시)
+    :param seconds: 모의 구간 길이(초)
+    :param profile: flat, open(장초반 집중), close(장마감 집중), u(양쪽 집중)
+    :param burst: 집중구간 최대 배율
+    :param hoga_ratio: 체결틱 1건당 호가잔량 전문 비율
+    :param condition_rate: 초당 조건검색 편입/이탈 묶음 수
+    :param order_rate: 초당 주문 수 (주문별로 접수 1건 + 부분체결 여러건 생성)
+    """
+
+    def __init__(self, symbols=50, rate=10, seconds=60, profile="u", burst=5.0, hoga_ratio=0.5, condition_rate=0.5,
+                 order_rate=0.5, start="090000", seed=None):
+        if profile not in PROFILES:
+            raise ValueError("profile: %s" % profile)
+
+        self.rate = rate
+        self.seconds = seconds
+        self.profile = profile
+        self.burst = burst
+        self.hoga_ratio = hoga_ratio
+        self.condition_rate = condition_rate
+        self.order_rate = order_rate
+        self.start = int(start[0:2]) * 3600 + int(start[2:4]) * 60 + int(start[4:6])
+
+        self.random = random.Random(seed)
+        self.symbols = [Symbol("%06d" % (900000 + i * 10), "모의종목%03d" % i,
+                               self.random.choice((1000, 3000, 8000, 25000, 70000)))
+                        for i in range(symbols)]
+        # 일부 종목에 거래가 몰리도록 가중치 부여
+        self.weights = [1.0 / (i + 1) for i in range(symbols)]
+
+        self.ord_no = 0
+        self.contract_no = 0
+
+    def multiplier(self, t):
+        """시점 t(초)의 부하 배율"""
+        frac = t / self.seconds
+        open_burst = (self.burst - 1) * math.exp(-frac / 0.05)
+        close_burst = (self.burst - 1) * math.exp(-(1 - frac) / 0.05)
+        if self.profile == "open":
+            return 1 + open_burst
+        elif self.profile == "close":
+            return 1 + close_burst
+        elif self.profile == "u":
+            return 1 + open_burst + close_burst
+        return 1.0
+
+    def clock(self, t):
+        """모의 시각 HHMMSS"""
+        seconds = self.start + int(t)
+        return "%02d%02d%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+    def events(self):
+        """(시각, 이벤트종류, 인자) 를 시간순으로 생성
+
+        시간에 따라 변하는 발생률은 최대 배율로 생성한 뒤 배율 비율로 솎아낸다.
+        """
+        peak = max(self.multiplier(0), self.multiplier(self.seconds), 1.0)
+        tick_rate = self.rate * len(self.symbols) * (1 + self.hoga_ratio) * peak
+        condition_rate = self.condition_rate * peak
+        order_rate = self.order_rate * peak
+        total_rate = tick_rate + condition_rate + order_rate
+
+        rnd = self.random
+        scheduled = []  # 체결통보 예약 (시각, 순번, 값)
+        seq = 0
+        t = 0.0
+        while True:
+            t += rnd.expovariate(total_rate)
+
+            while scheduled and scheduled[0][0] <= min(t, self.seconds):
+                at, _, values = heapq.heappop(scheduled)
+                yield at, "chejan", values
+
+            if t >= self.seconds:
+                break
+            if rnd.random() * peak > self.multiplier(t):
+                continue
+
+            pick = rnd.random() * total_rate
+            if pick < tick_rate:
+                symbol = rnd.choices(self.symbols, self.weights)[0]
+                if rnd.random() * (1 + self.hoga_ratio) < 1:
+                    yield t, "real", (symbol.code, "주식체결", self.contract_packet(symbol, t))
+                else:
+                    yield t, "real", (symbol.code, "주식호가잔량", self.hoga_packet(symbol, t))
+            elif pick < tick_rate + condition_rate:
+                # 조건검색 편입/이탈은 몰려서 들어온다
+                kind = rnd.choice("ID")
+                for symbol in rnd.sample(self.symbols, min(len(self.symbols), rnd.randint(1, 10))):
+                    yield t, "condition", (symbol.code, kind, CONDITION_NAME, "0")
+            else:
+                for at, values in self.order_sequence(rnd.choices(self.symbols, self.weights)[0], t):
+                    seq += 1
+                    heapq.heappush(scheduled, (at, seq, values))
+
+    def contract_packet(self, symbol, t):
+        """주식체결 전문"""
+        qty = symbol.step(self.random)
+        price = symbol.price
+        tick = tick_size(price)
+        values = {
+            "20": self.clock(t),
+            "10": signed(price, symbol.base),
+            "11": "%+d" % (price - symbol.base) if price != symbol.base else "0",
+            "12": "%+.2f" % ((price - symbol.base) * 100.0 / symbol.base),
+            "27": signed(price + tick, symbol.base),
+            "28": signed(price, symbol.base),
+            "15": "%+d" % qty,
+            "13": str(symbol.volume),
+            "14": str(symbol.amount // 1000000),
+            "16": signed(symbol.open, symbol.base),
+            "17": signed(symbol.high, symbol.base),
+            "18": signed(symbol.low, symbol.base),
+            "25": "2" if price > symbol.base else "5" if price < symbol.base else "3",
+            "228": "%.2f" % (self.random.uniform(50, 200)),
+            "290": "2",
+        }
+        return "\t".join(values.get(fid, "0") for fid in REAL_FID_LIST["주식체결"])
+
+    def hoga_packet(self, symbol, t):
+        """주식호가잔량 전문"""
+        price = symbol.price
+        tick = tick_size(price)
+        rnd = self.random
+        values = {"21": self.clock(t)}
+        for i in range(10):
+            values[str(41 + i)] = signed(price + tick * (i + 1), symbol.base)
+            values[str(51 + i)] = signed(price - tick * i, symbol.base)
+            values[str(61 + i)] = str(rnd.randint(1, 5000))
+            values[str(71 + i)] = str(rnd.randint(1, 5000))
+        values["121"] = str(sum(int(values[str(61 + i)]) for i in range(10)))
+        values["125"] = str(sum(int(values[str(71 + i)]) for i in range(10)))
+        values["13"] = str(symbol.volume)
+        return "\t".join(values.get(fid, "0") for fid in REAL_FID_LIST["주식호가잔량"])
+
+    def order_sequence(self, symbol, t):
+        """주문 1건의 접수 + 부분체결 통보 목록
+
+        data/trading_bak.sql 처럼 체결량(911), 수수료(938)는 누적값이고
+        단위체결가/량(914, 915)은 체결 건별 값이다.
+        """
+        rnd = self.random
+        self.ord_no += 1
+        ord_no = "%07d" % self.ord_no
+        side = rnd.choice((1, 2))
+        qty = 100
+        base = {
+            "9201": "8000000011", "9203": ord_no, "9205": "", "9001": "A" + symbol.code, "912": "JJ",
+            "302": symbol.name.ljust(40), "900": str(qty), "901": "0", "904": "0000000",
+            "905": "+매수" if side == 2 else "-매도", "906": "시장가", "907": str(side), "920": "0001",
+            "921": "0", "922": "00", "923": "00000000",
+        }
+
+        at = t + rnd.uniform(0.01, 0.2)
+        accepted = dict(base)
+        accepted.update({"913": "접수", "902": str(qty), "903": "0", "908": self.clock(at), "909": "", "910": "",
+                         "911": "", "914": "", "915": "", "938": "0", "939": "0"})
+        sequence = [(at, accepted)]
+
+        filled = 0
+        amount = 0
+        while filled < qty:
+            at += rnd.expovariate(2.0)
+            unit_qty = qty - filled if rnd.random() < 0.3 else rnd.randint(1, qty - filled)
+            unit_price = symbol.price
+            filled += unit_qty
+            amount += unit_qty * unit_price
+            self.contract_no += 1
+
+            fill = dict(base)
+            fill.update({
+                "913": "체결", "902": str(qty - filled), "903": str(amount), "908": self.clock(at),
+                "909": str(self.contract_no), "910": str(unit_price), "911": str(filled),
+                "10": signed(unit_price, symbol.base), "914": str(unit_price), "915": str(unit_qty),
+                "938": str(amount * 15 // 100000 // 10 * 10), "939": str(amount * 3 // 1000 if side == 1 else 0),
+            })
+            sequence.append((at, fill))
+        return sequence
+
+    def run(self, target, control=None, realtime=False):
+        """대상 파이프라인에 이벤트를 전달하고 처리 결과를 반환
+
+        :param target: OnReceiveRealData, OnReceiveRealCondition, OnReceiveChejanData 중 일부를 가진 객체
+        :param control: target 이 GetChejanData 를 호출하는 ReplayControl
+        :param realtime: True 면 모의 시각에 맞춰 전달, False 면 최대 속도로 전달
+
+        최대 속도 모드에서도 측정한 처리시간으로 단일 스레드 큐를 재현해서
+        실시간으로 받았을 때의 지연과 적체를 계산한다.
+        target 에 drainTicks 예약(drain_scheduled)이 있으면 Qt 이벤트 루프처럼
+        다음 이벤트가 도착하기 전에 큐가 비었을 때 drainTicks 를 호출하고 그 시간도 처리시간에 포함한다.
+        """
+        control = control or getattr(target, "kiwoom", None) or ReplayControl()
+        on_real = getattr(target, "OnReceiveRealData", None)
+        on_condition = getattr(target, "OnReceiveRealCondition", None)
+        on_chejan = getattr(target, "OnReceiveChejanData", None)
+        chejan_cnt = len(CHEJAN_FID_LIST.split(";"))
+
+        drain = getattr(target, "drainTicks", None)
+
+        counts = dict(real=0, condition=0, chejan=0, drain=0)
+        arrivals = {}     # 초별 도착 건수
+        busy = 0.0
+        done = 0.0        # 모의 시계 기준 직전 이벤트 처리 완료 시각
+        max_lag = 0.0
+        pending = []      # 처리 완료 시각 (적체 계산용)
+        backlog = []      # 초별 적체 (초, 적체건수)
+        next_sample = 1.0
+
+        events = self.events()
+        event = next(events, None)
+        started = time.perf_counter()
+        while event is not None:
+            t, kind, args = event
+            if realtime:
+                wait = t - (time.perf_counter() - started)
+                if wait > 0.001:
+                    time.sleep(wait)
+
+            begin = time.perf_counter()
+            if kind == "real":
+                if on_real:
+                    on_real(*args)
+            elif kind == "condition":
+                if on_condition:
+                    on_condition(*args)
+            else:
+                control.chejan = args
+                if on_chejan:
+                    on_chejan("0", chejan_cnt, CHEJAN_FID_LIST)
+            elapsed = time.perf_counter() - begin
+
+            counts[kind] += 1
+            arrivals[int(t)] = arrivals.get(int(t), 0) + 1
+            busy += elapsed
+            if realtime:
+                done = begin - started + elapsed
+            else:
+                done = max(done, t) + elapsed
+            max_lag = max(max_lag, done - t)
+
+            # 도착했지만 아직 처리되지 않은 이벤트 수
+            while next_sample <= t:
+                while pending and pending[0] <= next_sample:
+                    heapq.heappop(pending)
+                backlog.append((next_sample, len(pending)))
+                next_sample += 1.0
+            heapq.heappush(pending, done)
+
+            event = next(events, None)
+            if drain is not None and target.drain_scheduled:
+                now = time.perf_counter() - started if realtime else done
+                if event is None or event[0] > now:
+                    begin = time.perf_counter()
+                    drain()
+                    elapsed = time.perf_counter() - begin
+                    counts["drain"] += 1
+                    busy += elapsed
+                    done = begin - started + elapsed if realtime else done + elapsed
+
+        wall = time.perf_counter() - started
+        total = counts["real"] + counts["condition"] + counts["chejan"]
+        growth = 0.0
+        if len(backlog) > 1:
+            growth = (backlog[-1][1] - backlog[0][1]) / (backlog[-1][0] - backlog[0][0])
+
+        report = dict(
+            events=total,
+            counts=counts,
+            offered_rate=total / self.seconds,
+            peak_rate=max(arrivals.values() or [0]),
+            sustainable_rate=total / busy if busy else float("inf"),
+            utilization=busy / self.seconds,
+            wall=wall,
+            max_lag=max_lag,
+            backlog_end=backlog[-1][1] if backlog else 0,
+            backlog_growth=growth,
+        )
+        logger.info("load report: %s", report)
+        return report
+
+
+def trading_target(control, db_path=":memory:", trade=True):
+    """실제 매매 이벤트 처리기 (Trader) 를 Qt 없이 ReplayControl 로 생성
+
+    주문은 ReplayControl 로만 나가므로 기본으로 brain 매매 경로까지 측정한다.
+    """
+    trader = Trader(control, Database(db_path), trade=trade)
+    trader.user = dict(accno=["8000000011"])
+    return trader
+
+
+class DecodeTarget:
+    """기본 측정 대상: 실시간 전문 파싱과 체결통보 수신만 수행"""
+
+    def __init__(self, control):
+        self.kiwoom = control
+        self.last = {}
+
+    def OnReceiveRealData(self, sJongmokCode, sRealType, sRealData):
+        if sRealType == "주식체결":
+            fields = sRealData.split('\t')
+            price = int(fields[1].replace('+', '').replace('-', ''))  # 현재가
+            sell = int(fields[4].replace('+', '').replace('-', ''))  # (최우선) 매도호가
+            buy = int(fields[5].replace('+', '').replace('-', ''))  # (최우선) 매수호가
+            self.last[sJongmokCode] = dict(code=sJongmokCode, price=price, sell=sell, buy=buy)
+
+    def OnReceiveRealCondition(self, strCode, strType, strConditionName, strConditionIndex):
+        pass
+
+    def OnReceiveChejanData(self, sGubun, nItemCnt, sFidList):
+        data = []
+        for fid in sFidList.split(";"):
+            CODE.get_fid_msg(fid)
+            data.append(self.kiwoom.GetChejanData(int(fid)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="모의 시세 부하 생성기")
+    parser.add_argument("--symbols", type=int, default=50, help="종목수")
+    parser.add_argument("--rate", type=float, default=10, help="종목당 초당 체결틱 수")
+    parser.add_argument("--seconds", type=float, default=60, help="모의 구간 길이(초)")
+    parser.add_argument("--profile", choices=PROFILES, default="u", help="시간대별 부하 형태")
+    parser.add_argument("--burst", type=float, default=5.0, help="집중구간 최대 배율")
+    parser.add_argument("--order-rate", type=float, default=0.5, help="초당 주문 수")
+    parser.add_argument("--realtime", action="store_true", help="모의 시각에 맞춰 전달")
+    parser.add_argument("--target", choices=("trader", "decode"), default="trader",
+                        help="trader: 실제 이벤트 처리기, decode: 전문 파싱만")
+    parser.add_argument("--db", default=":memory:", help="trader 대상의 DB 파일 경로")
+    parser.add_argument("--no-trade", action="store_true", help="trader 대상에서 brain 매매 경로 제외")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format="[%(asctime)-15s] %(name)s:%(levelname)s - %(message)s")
+
+    generator = LoadGenerator(symbols=args.symbols, rate=args.rate, seconds=args.seconds, profile=args.profile,
+                              burst=args.burst, order_rate=args.order_rate, seed=args.seed)
+    control = ReplayControl()
+    if args.target == "trader":
+        target = trading_target(control, args.db, trade=not args.no_trade)
+    else:
+        target = DecodeTarget(control)
+    generator.run(target, control, realtime=args.realtime)
@@ -0,0 +1,131 @@
+import logging
+from datetime import date
+
+from database import normalize_code
+
+logger = logging.getLogger(__name__)
+
+# GetCodeListByMarket 시장구분
+MARKETS = {
+    "0": "장내",
+    "10": "코스닥",
+    "8": "ETF",
+}
+
+
+def tick_size(price):
+    """호가단위"""
+    if price < 1000:
+        return 1
+    elif price < 5000:
+        return 5
+    elif price < 10000:
+        return 10
+    elif price < 50000:
+        return 50
+    elif price < 100000:
+        return 100
+    elif price < 500000:
+        return 500
+    return 1000
+
+
+def price_limit(price, rate=0.3):
+    """전일종가 기준 (하한가, 상한가)"""
+    upper = int(price * (1 + rate))
+    lower = int(price * (1 - rate) + 0.9999)
+    upper -= upper % tick_size(upper)
+    lower += -lower % tick_size(lower)
+    return lower, upper
+
+
+class SymbolMaster:
+    """종목마스터
+
+    하루 한번 키움 API 마스터 정보를 SYMBOL 테이블에 저장하고, 시작시 메모리에 올려
+    종목코드 -> symbol id, symbol id -> 종목명/시장/상장주식수/전일종가/가격제한폭을 O(1)로 조회한다.
+    symbol id 는 SYMBOL.id 이며 목록 인덱스로 사용한다.
+    종목코드 -> symbol id 는 Database.symbols 하나만 사용한다.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.codes = [None]
+        self.names = [None]
+        self.markets = [None]
+        self.listed = [None]
+        self.prev_close = [None]
+        self.limits = [None]
+        self.updated = None
+
+    def load(self):
+        """SYMBOL 테이블을 메모리 인덱스로 로드"""
+        rows = self.db.select_symbols()
+        size = (rows[-1][0] if rows else 0) + 1
+        self.codes = [None] * size
+        self.names = [None] * size
+        self.markets = [None] * size
+        self.listed = [None] * size
+        self.prev_close = [None] * size
+        self.limits = [None] * size
+        self.updated = None
+
+        for symbol_id, code, name, market, listed_cnt, last_price, upd_date in rows:
+            self._set(symbol_id, code, name, market, listed_cnt, last_price)
+            if upd_date and (self.updated is None or upd_date > self.updated):
+                self.updated = upd_date
+        logger.info("종목마스터 로드: %s종목, 기준일 %s", len(rows), self.updated)
+
+    def _set(self, symbol_id, code, name, market=None, listed_cnt=None, last_price=None):
+        if symbol_id >= len(self.codes):
+            grow = symbol_id + 1 - len(self.codes)
+            for values in (self.codes, self.names, self.markets, self.listed, self.prev_close, self.limits):
+                values.extend([None] * grow)
+        self.codes[symbol_id] = code
+        self.names[symbol_id] = name
+        self.markets[symbol_id] = market
+        self.listed[symbol_id] = listed_cnt
+        self.prev_close[symbol_id] = last_price
+        self.limits[symbol_id] = price_limit(last_price) if last_price else None
+
+    def stale(self):
+        """오늘 갱신되지 않았으면 True"""
+        return self.updated != int(date.today().strftime("%Y%m%d"))
+
+    def refresh(self, kiwoom):
+        """키움 API 마스터 정보로 SYMBOL 테이블 갱신 후 다시 로드"""
+        today = int(date.today().strftime("%Y%m%d"))
+        rows = []
+        for market in MARKETS:
+            for code in kiwoom.GetCodeListByMarket(market).split(';'):
+                if not code:
+                    continue
+                name = kiwoom.GetMasterCodeName(code).strip()
+                last_price = int(kiwoom.GetMasterLastPrice(code) or 0)
+                listed_cnt = int(kiwoom.GetMasterListedStockCnt(code) or 0)
+                rows.append((code, name, market, listed_cnt, last_price, today))
+
+        self.db.upsert_symbols(rows)
+        logger.info("종목마스터 갱신: %s종목", len(rows))
+        self.load()
+
+    def id(self, code):
+        """종목코드 -> symbol id, 마스터에 없는 종목은 SYMBOL 에 추가"""
+        symbol_id = self.db.symbols.get(code)
+        if symbol_id is None:
+            code = normalize_code(code)
+            symbol_id = self.db.symbol_id(code)
+        if symbol_id >= len(self.codes) or self.codes[symbol_id] is None:
+            # 마스터 로드 이후 SYMBOL 에 추가된 종목
+            self._set(symbol_id, code, None)
+        return symbol_id
+
+    def code(self, symbol_id):
+        return self.codes[symbol_id]
+
+    def name(self, symbol_id):
+        return self.names[symbol_id]
+
+    def limit(self, symbol_id):
+        """(하한가, 상한가), 전일종가가 없으면 None"""
+        return self.limits[symbol_id]
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""기존 ORD 테이블을 SYMBOL + 월별 ORD_YYYYMM 파티션으로 이관
+
+사용법
+python migrate.py                # 이관만 수행 (ORD 테이블 유지)
+python migrate.py --drop         # 이관 후 ORD 테이블 삭제 및 VACUUM
+
+이관이 끝나면 PRAGMA user_version 에 기록하고, 이미 이관된 DB 는 이관하지 않고 종료코드 1로 끝난다.
+(--drop 이면 ORD 테이블만 삭제)
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from database import DB_PATH, Database
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10000
+
+# 이관 완료 표시 (PRAGMA user_version), 이관과 같은 트랜잭션에서 기록
+MIGRATED_VERSION = 1
+
+
+def migrate(path=DB_PATH, drop=False):
+    """ORD 이관, 이미 이관된 DB 면 False"""
+    before = os.path.getsize(path)
+    db = Database(path)
+
+    exists = db.cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'ORD'").fetchone()[0]
+    if not exists:
+        logger.info("ORD 테이블 없음: %s", path)
+        return True
+
+    # 이관 여부는 파티션 데이터가 아니라 user_version 으로 판단 (파티션에는 실시간 체결도 저장된다)
+    if db.cursor.execute("PRAGMA user_version").fetchone()[0] >= MIGRATED_VERSION:
+        if not drop:
+            logger.error("이미 이관된 DB 라서 이관하지 않음: %s", path)
+            return False
+        logger.info("이미 이관된 DB, ORD 테이블만 삭제: %s", path)
+        drop_ord(db)
+        return True
+
+    # 전체를 한 트랜잭션으로 이관, 실패하면 전부 되돌린다
+    # insert_ord 가 같은 커서를 사용하므로 읽기는 별도 커서로
+    reader = db.db.cursor()
+    reader.execute("SELECT ord_no, stock_code, stock_name, ord_type, contract_time, contract_no, price, qty, charge, "
+                   "tax, time FROM ORD ORDER BY rowid")
+    count = 0
+    try:
+        while True:
+            rows = reader.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            db.insert_ord([row[:10] + (datetime.strptime(row[10], "%Y-%m-%d %H:%M:%S"),) for row in rows],
+                          commit=False)
+            count += len(rows)
+            logger.info("migrated: %s", count)
+        db.cursor.execute("PRAGMA user_version = %d" % MIGRATED_VERSION)
+        db.db.commit()
+    except Exception:
+        db.db.rollback()
+        logger.exception("이관 실패, 롤백")
+        raise
+    finally:
+        reader.close()
+
+    if drop:
+        drop_ord(db)
+
+    del db
+    logger.info("ORD %s건 이관 완료, 파일크기 %s -> %s bytes", count, before, os.path.getsize(path))
+    return True
+
+
+def drop_ord(db):
+    """이관한 ORD 테이블 삭제 및 VACUUM"""
+    db.cursor.execute("DROP TABLE ORD")
+    db.db.commit()
+    db.cursor.execute("VACUUM")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ORD 테이블 이관")
+    parser.add_argument("--db", default=DB_PATH, help="DB 파일 경로")
+    parser.add_argument("--drop", action="store_true", help="이관 후 ORD 테이블 삭제")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)-15s] %(name)s:%(levelname)s - %(message)s")
+    if not migrate(args.db, args.drop):
+        sys.exit(1)
@@ -0,0 +1,186 @@
+import logging
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 주문상태
+PENDING = "pending"            # SendOrder 호출, 주문번호 수신 전
+ACCEPTED = "accepted"          # 접수
+PARTIALLY_FILLED = "partial"   # 일부체결
+FILLED = "filled"              # 전량체결
+REJECTED = "rejected"          # 거부
+CANCELLED = "cancelled"        # 취소
+
+DONE = (FILLED, REJECTED, CANCELLED)
+
+
+class Order:
+    """주문 1건"""
+    __slots__ = ("req_name", "symbol_id", "side", "qty", "price", "state", "ord_no", "filled", "amount", "cost",
+                 "msg", "created")
+
+    def __init__(self, req_name, symbol_id, side, qty, price):
+        self.req_name = req_name
+        self.symbol_id = symbol_id
+        self.side = side
+        self.qty = qty
+        self.price = price          # 시장가 주문은 주문시점 현재가
+        self.state = PENDING
+        self.ord_no = None
+        self.filled = 0             # 누적 체결수량
+        self.amount = 0             # 누적 체결금액
+        self.cost = 0               # 누적 수수료 + 세금
+        self.msg = None
+        self.created = datetime.now()
+
+    @property
+    def remaining(self):
+        return self.qty - self.filled
+
+    @property
+    def avg_price(self):
+        return self.amount / self.filled if self.filled else None
+
+    def __repr__(self):
+        return "Order(%s)" % dict(req_name=self.req_name, ord_no=self.ord_no, symbol_id=self.symbol_id, side=self.side,
+                                  qty=self.qty, filled=self.filled, state=self.state, msg=self.msg)
+
+
+class OrderTracker:
+    """주문 상태 관리
+
+    주문은 사용자구분명(req_name)과 주문번호(ord_no)로 색인하고, 미완료 주문은
+    (symbol id, 매도수구분)별 개수로 관리해서 진행중 주문 여부를 O(1)로 조회한다.
+    """
+
+    def __init__(self, on_close=None):
+        self.on_close = on_close  # 주문 완료시 호출, on_close(order)
+        self.seq = 0
+        self.by_req = {}        # req_name -> Order
+        self.by_ord_no = {}     # ord_no -> Order
+        self.open_orders = {}   # req_name -> Order (미완료)
+        self.open_count = {}    # (symbol id, side) -> 미완료 주문수
+        self.unbound = {}       # (symbol id, side) -> 주문번호 미수신 주문 (발송순)
+
+    def new_req_name(self):
+        """초당 여러 주문도 구분되는 사용자구분명"""
+        self.seq += 1
+        return "ORD_%s_%05d" % (datetime.now().strftime("%H%M%S"), self.seq)
+
+    def create(self, symbol_id, side, qty, price):
+        """SendOrder 직전 주문 생성"""
+        order = Order(self.new_req_name(), symbol_id, side, qty, price)
+        self.by_req[order.req_name] = order
+        self.open_orders[order.req_name] = order
+        key = (symbol_id, side)
+        self.open_count[key] = self.open_count.get(key, 0) + 1
+        self.unbound.setdefault(key, deque()).append(order)
+        return order
+
+    def has_open(self, symbol_id, side):
+        """진행중인 주문 여부"""
+        return self.open_count.get((symbol_id, side), 0) > 0
+
+    def get(self, req_name):
+        return self.by_req.get(req_name)
+
+    def bind(self, order, ord_no):
+        """주문번호 연결"""
+        if order.ord_no is not None or not ord_no:
+            return
+        order.ord_no = ord_no
+        self.by_ord_no[ord_no] = order
+        pending = self.unbound.get((order.symbol_id, order.side))
+        if pending and order in pending:
+            pending.remove(order)
+
+    def on_tr_data(self, req_name, ord_no):
+        """주문 TR 응답: 주문번호가 있으면 접수, 없으면 거부"""
+        order = self.by_req.get(req_name)
+        if order is None:
+            return None
+        ord_no = ord_no.strip()
+        if ord_no:
+            self.bind(order, ord_no)
+            if order.state == PENDING:
+                order.state = ACCEPTED
+        elif order.state == PENDING:
+            self.finish(order, REJECTED)
+        return order
+
+    def on_msg(self, req_name, msg):
+        """서버메시지 기록
+
+        메시지 문구로는 거부 여부를 판단하지 않는다. 거부는 주문 TR 응답에 주문번호가 없는 것으로 판단하고
+        (on_tr_data), 여기서 남긴 메시지는 거부사유로 로그에 남는다.
+        """
+        order = self.by_req.get(req_name)
+        if order is None:
+            return None
+        order.msg = msg
+        return order
+
+    def on_chejan(self, symbol_id, side, ord_no, status, remaining, filled, unit_price, unit_qty, total_cost,
+                  orig_ord_no=None, cancel=False):
+        """주문체결통보 반영
+
+        :param status: 주문상태 (접수, 체결, 확인)
+        :param filled: 누적 체결수량
+        :param total_cost: 누적 수수료 + 세금
+        :return (주문, 이번 체결분 수수료+세금), 모르는 주문이면 (None, 0)
+        """
+        if cancel and status == "확인":
+            # 취소확인은 원주문을 취소 처리
+            order = self.by_ord_no.get(orig_ord_no)
+            if order is not None and order.state not in DONE:
+                self.finish(order, CANCELLED)
+            return order, 0
+
+        order = self.by_ord_no.get(ord_no)
+        if order is None:
+            # TR 응답보다 체결통보가 먼저 오면 같은 종목/구분의 가장 먼저 보낸 주문과 연결
+            pending = self.unbound.get((symbol_id, side))
+            if not pending:
+                logger.debug("추적하지 않는 주문: %s", dict(ord_no=ord_no, symbol_id=symbol_id, side=side))
+                return None, 0
+            order = pending[0]
+            self.bind(order, ord_no)
+
+        if order.state in DONE:
+            return order, 0
+
+        if status == "접수":
+            if order.state == PENDING:
+                order.state = ACCEPTED
+            return order, 0
+
+        if status != "체결" or not unit_qty:
+            return order, 0
+
+        cost = total_cost - order.cost
+        order.cost = total_cost
+        order.filled = filled
+        order.amount += unit_price * unit_qty
+        if remaining == 0 or order.filled >= order.qty:
+            self.finish(order, FILLED)
+        else:
+            order.state = PARTIALLY_FILLED
+        return order, cost
+
+    def finish(self, order, state):
+        """주문 완료 처리 후 미완료 색인에서 제거"""
+        order.state = state
+        if self.open_orders.pop(order.req_name, None) is None:
+            return
+        key = (order.symbol_id, order.side)
+        self.open_count[key] -= 1
+        if not self.open_count[key]:
+            del self.open_count[key]
+        pending = self.unbound.get(key)
+        if pending and order in pending:
+            pending.remove(order)
+        logger.info("주문 %s: %s", state, order)
+        if self.on_close is not None:
+            self.on_close(order)
+
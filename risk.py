@@ -0,0 +1,176 @@
+import logging
+from collections import deque
+from datetime import date
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+# 매도수구분 (FID 907)
+SIDE_SELL = 1
+SIDE_BUY = 2
+
+
+class RiskManager:
+    """주문 전 리스크 점검
+
+    SendOrder 직전에 호출되며 모든 카운터는 체결/주문 시점에 증분 갱신되므로
+    check()는 DB 조회 없이 O(1)로 끝난다.
+    """
+
+    def __init__(self, max_positions=10, max_symbol_notional=5000000, max_total_notional=30000000,
+                 max_orders_per_minute=30, max_daily_loss=500000):
+        self.max_positions = max_positions                  # 최대 보유종목수
+        self.max_symbol_notional = max_symbol_notional      # 종목당 최대 매수금액
+        self.max_total_notional = max_total_notional        # 전체 최대 매수금액
+        self.max_orders_per_minute = max_orders_per_minute  # 분당 최대 주문건수
+        self.max_daily_loss = max_daily_loss                # 일일 손실한도
+
+        self.day = None
+        self.reset()
+
+    def reset(self):
+        """일자 변경시 카운터 초기화"""
+        self.day = date.today()
+        self.positions = {}   # symbol id -> [보유수량, 매입금액]
+        self.pending = {}     # symbol id -> [미체결 매수수량, 예상금액]
+        self.pending_total = 0
+        self.symbol_count = 0  # 보유 또는 미체결 매수중인 종목수 (positions, pending 어느 한쪽에라도 있는 종목)
+        self.limits = {}      # symbol id -> (하한가, 상한가)
+        self.total_notional = 0
+        self.realized = 0
+        self.halted = False
+        self.order_times = deque()
+
+    def _roll(self):
+        if self.day != date.today():
+            logger.info("리스크 카운터 초기화: %s", self.day)
+            self.reset()
+
+    def set_limit(self, symbol_id, limit):
+        """가격 제한폭 설정, limit: 종목마스터의 (하한가, 상한가)"""
+        self.limits[symbol_id] = limit
+
+    def position_qty(self, symbol_id):
+        """보유수량"""
+        position = self.positions.get(symbol_id)
+        return position[0] if position else 0
+
+    def can_open(self):
+        """신규 종목 편입 가능 여부"""
+        self._roll()
+        return not self.halted and self.symbol_count < self.max_positions
+
+    def check(self, symbol_id, side, qty, price):
+        """주문 가능 여부 점검
+
+        :return (True, None) 또는 (False, 거부사유)
+        """
+        self._roll()
+
+        # 보유수량 이내 매도는 포지션을 줄이므로 주문건수를 포함한 나머지 한도를 점검하지 않는다
+        if side == SIDE_SELL:
+            position = self.positions.get(symbol_id)
+            if not position or position[0] < qty:
+                return False, "매도가능수량 부족"
+            return True, None
+
+        # 분당 주문건수: 1분이 지난 주문시각은 앞에서부터 제거
+        now = monotonic()
+        times = self.order_times
+        while times and now - times[0] >= 60:
+            times.popleft()
+        if len(times) >= self.max_orders_per_minute:
+            return False, "분당 주문건수 초과"
+
+        if self.halted:
+            return False, "일일 손실한도 도달"
+
+        limit = self.limits.get(symbol_id)
+        if limit and not limit[0] <= price <= limit[1]:
+            return False, "가격 제한폭 초과"
+
+        notional = price * qty
+        position = self.positions.get(symbol_id)
+        if position is None and symbol_id not in self.pending and self.symbol_count >= self.max_positions:
+            return False, "최대 보유종목수 초과"
+
+        pending = self.pending.get(symbol_id)
+        symbol_notional = (position[1] if position else 0) + (pending[1] if pending else 0)
+        if symbol_notional + notional > self.max_symbol_notional:
+            return False, "종목당 매수금액 초과"
+
+        if self.total_notional + self.pending_total + notional > self.max_total_notional:
+            return False, "전체 매수금액 초과"
+
+        times.append(now)
+        if pending is None:
+            if position is None:
+                self.symbol_count += 1
+            self.pending[symbol_id] = [qty, notional]
+        else:
+            pending[0] += qty
+            pending[1] += notional
+        self.pending_total += notional
+        return True, None
+
+    def on_reject(self, symbol_id, side, qty, price):
+        """주문 거부/취소시 예약한 매수금액 반환"""
+        if side == SIDE_BUY:
+            self._release(symbol_id, qty)
+
+    def on_fill(self, symbol_id, side, qty, price, cost=0):
+        """체결 반영
+
+        :param qty: 단위체결량
+        :param price: 단위체결가
+        :param cost: 수수료 + 세금
+        """
+        self._roll()
+        notional = price * qty
+        if side == SIDE_BUY:
+            # 미체결 해제 전에 포지션을 먼저 만들어 종목수가 줄었다 늘지 않도록 한다
+            position = self.positions.get(symbol_id)
+            if position is None:
+                if symbol_id not in self.pending:
+                    self.symbol_count += 1
+                position = self.positions[symbol_id] = [0, 0]
+            position[0] += qty
+            position[1] += notional
+            self.total_notional += notional
+            self._release(symbol_id, qty)
+        else:
+            position = self.positions.get(symbol_id)
+            if not position:
+                logger.warning("보유하지 않은 종목 매도체결: %s", symbol_id)
+                return
+            # 평균 매입단가 기준 실현손익
+            cost_basis = position[1] * qty // position[0]
+            position[0] -= qty
+            position[1] -= cost_basis
+            self.total_notional -= cost_basis
+            self.realized += notional - cost_basis
+            if position[0] <= 0:
+                del self.positions[symbol_id]
+                if symbol_id not in self.pending:
+                    self.symbol_count -= 1
+
+        self.realized -= cost
+        if not self.halted and self.realized <= -self.max_daily_loss:
+            self.halted = True
+            logger.warning("일일 손실한도 도달, 신규매수 중지: %s", self.realized)
+
+    def _release(self, symbol_id, qty):
+        """체결/거부된 수량만큼 미체결 예상금액 해제"""
+        pending = self.pending.get(symbol_id)
+        if pending is None:
+            return
+        if qty >= pending[0]:
+            del self.pending[symbol_id]
+            self.pending_total -= pending[1]
+            if symbol_id not in self.positions:
+                self.symbol_count -= 1
+            return
+        released = pending[1] * qty // pending[0]
+        pending[0] -= qty
+        pending[1] -= released
+        self.pending_total -= released
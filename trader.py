@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import defaultdict
+import code as CODE
+from conflate import TickConflator
+from database import to_int
+from master import SymbolMaster
+from order import OrderTracker, FILLED, REJECTED, CANCELLED
+from risk import RiskManager, SIDE_BUY, SIDE_SELL
+
+SCREEN_CONDITION_SEARCH = '0001'
+
+SCREEN_BUY_STOCK = '0010'
+SCREEN_SELL_STOCK = '0011'
+
+# 실시간 체결틱으로 brain 매매(시장가 주문) 실행 여부, 기본은 실행하지 않음
+TRADE_ON_REAL_DATA = False
+
+# 체결틱 병합 사용 여부 (False 면 틱마다 brain 호출)
+CONFLATE_TICKS = True
+
+logger = logging.getLogger(__name__)
+
+
+class Trader:
+    """키움 API 이벤트 처리와 매매 로직
+
+    Qt 와 무관하게 동작하도록 API 제어 객체(kiwoom)와 DB 를 받아서 사용한다.
+    TradingWindow 는 QAxWidget 이벤트를 여기에 연결하고, loadgen 은 ReplayControl 로 직접 호출한다.
+
+    :param schedule: 병합된 체결틱 평가(drainTicks)를 이벤트 루프에 예약하는 함수,
+                     None 이면 호출하는 쪽에서 drain_scheduled 를 보고 drainTicks 를 호출한다.
+    :param trade: 실시간 체결틱으로 brain 매매 실행 여부
+    """
+
+    def __init__(self, kiwoom, db, schedule=None, trade=TRADE_ON_REAL_DATA):
+        self.kiwoom = kiwoom
+        self.schedule = schedule
+        self.trade = trade
+
+        self.user = None
+
+        infinite_dict = lambda: defaultdict(infinite_dict)
+        self.watch = infinite_dict()
+        self.used = []
+
+        # DB 연결
+        self.db = db
+
+        # 종목마스터
+        self.symbols = SymbolMaster(self.db)
+        self.symbols.load()
+
+        # 주문전 리스크 점검
+        self.risk = RiskManager()
+
+        # 주문 상태 관리
+        self.orders = OrderTracker(on_close=self.onOrderClosed)
+
+        # 체결틱 병합 큐
+        self.conflator = TickConflator() if CONFLATE_TICKS else None
+        self.drain_scheduled = False
+
+    def login(self):
+        """키움증권 로그인
+        CommConnect()
+        :return 0 - 성공, 음수값은 실패
+        로그인이 성공하거나 실패하는 경우 OnEventConnect 이벤트가 발생하고 이벤트의 인자 값으로 로그인 성공 여부를 알 수 있다.
+        """
+        connect_result = self.kiwoom.CommConnect()
+        if connect_result == 0:
+            logger.debug("로그인 윈도우 실행 성공")
+        else:
+            logger.debug("로그인 윈도우 실행 실패")
+
+    def get_login_info(self):
+        """로그인 정보를 반환
+
+        - “ACCOUNT_CNT” – 전체 계좌 개수를 반환한다.
+        - "ACCNO" – 전체 계좌를 반환한다. 계좌별 구분은 ‘;’이다.
+        - “USER_ID” - 사용자 ID를 반환한다.
+        - “USER_NAME” – 사용자명을 반환한다.
+        - “KEY_BSECGB” – 키보드보안 해지여부. 0:정상, 1:해지
+        - “FIREW_SECGB” – 방화벽 설정 여부. 0:미설정, 1:설정, 2:해지
+        """
+        account_cnt = self.kiwoom.GetLoginInfo("ACCOUNT_CNT")
+        ret_accno = self.kiwoom.GetLoginInfo("ACCNO")
+        user_id = self.kiwoom.GetLoginInfo("USER_ID")
+        user_name = self.kiwoom.GetLoginInfo("USER_NAME")
+        key_bsecgb = self.kiwoom.GetLoginInfo("KEY_BSECGB")
+        firew_secgb = self.kiwoom.GetLoginInfo("FIREW_SECGB")
+
+        # 계좌는 복수개이기때문에 ; 로 split
+        accno = ret_accno.split(';')[:-1]
+
+        login_info = dict(account_cnt=account_cnt, accno=accno, user_id=user_id, user_name=user_name,
+                          key_bsecgb=key_bsecgb, firew_secgb=firew_secgb)
+        logger.info('login_info: %s', login_info)
+
+        return login_info
+
+    def get_connect_state(self):
+        """현재접속상태를 반환"""
+        connect_state = self.kiwoom.GetConnectState()
+        if connect_state == 0:
+            print("미연결")
+        elif connect_state == 1:
+            print("연결완료")
+
+    def OnEventConnect(self, nErrCode):
+        """OnEventConnect: 서버 접속 관련 이벤트
+        입력값
+        LONG nErrCode : 에러 코드
+
+        비고
+        nErrCode가 0이면 로그인 성공, 음수면 실패
+        음수인 경우는 에러 코드 참조
+        """
+        logger.debug('OnEventConnect: %s', dict(nErrCode=nErrCode))
+
+        if nErrCode == 0:
+            logger.info("로그인 성공")
+
+            self.user = self.get_login_info()
+
+            # 종목마스터는 하루 한번 갱신
+            if self.symbols.stale():
+                self.symbols.refresh(self.kiwoom)
+
+            # 장시작시간 실세간 추가
+            # self.kiwoom.SetRealReg("REAL002", "", "215;20;214;", "0")
+
+            # 조건검색 시작
+            self.kiwoom.GetConditionLoad()
+
+        else:
+            logger.info("로그인 실패: %s" + dict(nErrCode=nErrCode))
+
+    def OnReceiveTrData(self, sScrNo, sRQName, sTrCode, sRecordName, sPreNext, nDataLength, sErrorCode, sMessage,
+                        sSplmMsg):
+        """OnReceiveTrData: 서버통신 후 데이터를 받은 시점을 알려준다.
+        입력값
+        sScrNo . 화면번호
+        sRQName . 사용자구분 명
+        sTrCode . Tran 명
+        sRecordName . Record 명
+        sPreNext . 연속조회 유무
+
+        비고
+        sRQName . CommRqData의 sRQName과 매핑되는 이름이다.
+        sTrCode . CommRqData의 sTrCode과 매핑되는 이름이다.
+        """
+        logger.debug('OnReceiveTrData: %s',
+              dict(sScrNo=sScrNo, sRQName=sRQName, sTrCode=sTrCode, sRecordName=sRecordName, sPreNext=sPreNext,
+                   nDataLength=nDataLength, sErrorCode=sErrorCode, sMessage=sMessage, sSplmMsg=sSplmMsg))
+
+        if self.orders.get(sRQName) is not None:
+            # 주문 TR 응답, 주문번호가 없으면 거부
+            ord_no = self.kiwoom.GetCommData(sTrCode, sRQName, 0, "주문번호")
+            self.orders.on_tr_data(sRQName, ord_no)
+            return
+
+        count = self.kiwoom.GetRepeatCnt(sTrCode, sRQName)
+        for i in range(0, count):
+            self.kiwoom.GetCommData(sTrCode, sRQName, i, )
+
+
+    def OnReceiveRealData(self, sJongmokCode, sRealType, sRealData):
+        """OnReceiveRealData: 실시간데이터를 받은 시점을 알려준다.
+
+        입력값
+        sJongmokCode . 종목코드
+        sRealType . 리얼타입
+        sRealData . 실시간 데이터전문
+        """
+        logger.debug('OnReceiveRealData: %s', dict(sJongmokCode=sJongmokCode, sRealType=sRealType, sRealData=sRealData))
+        if sRealType == "주식체결" and self.trade:
+            fields = sRealData.split('\t')
+            price = int(fields[1].replace('+', '').replace('-', ''))  # 현재가
+            sell = int(fields[4].replace('+', '').replace('-', ''))  # (최우선) 매도호가
+            buy = int(fields[5].replace('+', '').replace('-', ''))  # (최우선) 매수호가
+            volume = int(fields[6].replace('+', '').replace('-', ''))  # 거래량
+            # self.printData(sJongmokCode, fields)
+
+            if self.conflator is None:
+                self.brain(dict(code=sJongmokCode, price=price, sell=sell, buy=buy))
+                return
+
+            self.conflator.push(self.symbols.id(sJongmokCode), sJongmokCode, price, sell, buy, volume)
+            if not self.drain_scheduled:
+                # 대기중인 이벤트를 먼저 처리한 뒤 모인 종목을 한번에 평가
+                self.drain_scheduled = True
+                if self.schedule is not None:
+                    self.schedule(self.drainTicks)
+
+    def drainTicks(self):
+        """병합된 종목별 최신 틱으로 brain 실행"""
+        self.drain_scheduled = False
+        for data in self.conflator.drain():
+            try:
+                self.brain(data)
+            except Exception as e:
+                logger.exception(e)
+
+    def printData(self, jongmok, data):
+        logger.debug("종목: %s", jongmok)
+        # logger.debug("체결시간: %s", data[0])
+        logger.debug("현재가: %s", data[1])
+        # logger.debug("전일대비: %s", data[2])
+        logger.debug("등락률: %s", data[3])
+        logger.debug("매도 / 매수: %s / %s", data[4], data[5])
+        logger.debug("거래량: %s", data[6])
+        logger.debug("누적거래량: %s", data[7])
+        logger.debug("누적거래대금: %s", data[8])
+        logger.debug("시고저: %s / %s / %s", data[9], data[10], data[11])
+        logger.debug("체결강도: %s", data[18])
+        logger.debug("                     ")
+
+    def brain(self, data):
+        status = 2
+        diff = False
+
+        # 추적리스트에서 빠졌는데 다시 들어오지 않도록 방어로직
+        if data['code'] in self.used:
+            return
+
+        # watchList에 데이터가 없으면 구매
+        if not self.watch[data['code']]:
+            status = 1
+            self.watch[data['code']]['buy'] = data['price']
+
+        if self.watch[data['code']]['current'] != data['price']:
+            diff = True
+
+        # 현재가
+        self.watch[data['code']]['current'] = data['price']
+
+        # 고가, 병합된 틱이면 마지막 평가 이후 고가 반영 (매수 시점에는 매수가부터 시작)
+        high = data['price'] if status == 1 else max(data['price'], data.get('high', data['price']))
+        if not self.watch[data['code']]['high'] or high > self.watch[data['code']]['high']:
+            self.watch[data['code']]['high'] = high
+
+        # 매도시점 1. 최고가에서 2% 빠지면 매도
+        if (self.watch[data['code']]['high'] - self.watch[data['code']]['current']) / self.watch[data['code']]['high'] >= 0.02:
+            status = 3
+
+        # 매도시점 2. 매수가에서 4%로 수익나면 매도
+        if (self.watch[data['code']]['current'] - self.watch[data['code']]['buy']) / self.watch[data['code']]['current'] >= 0.04:
+            status = 3
+
+        if status == 1:
+            if not self.sendOrder(data['code'], 100, data['price']):
+                # 리스크 한도에 걸리거나 주문이 실패하면 추적하지 않음
+                self.watch.pop(data['code'], None)
+                return
+            logger.info('[1. 매수] 종목: %s, 매수가: %s', data['code'], data['price'])
+        elif status == 3:
+            symbol_id = self.symbols.id(data['code'])
+            if self.orders.has_open(symbol_id, SIDE_SELL):
+                # 이미 매도주문 진행중
+                return
+
+            if self.orders.has_open(symbol_id, SIDE_BUY):
+                # 매수주문이 아직 체결중이면 전량 체결(또는 취소) 후 보유수량 전체를 매도
+                logger.debug('[3. 매도대기] 종목: %s, 매수주문 체결중', data['code'])
+                return
+
+            qty = self.risk.position_qty(symbol_id) or 100
+            if not self.sendSell(data['code'], qty, data['price']):
+                # 다음 틱에 다시 매도
+                return
+            # 매도주문이 전량 체결되면 onOrderClosed 에서 추적 종료, 거부/취소되면 다음 틱에 다시 매도
+            logger.info('[3. 매도] 종목: %s, 현재가: %s, 고가: %s, 매수가: %s, 수익률: %s', data['code'], data['price'],
+                         self.watch[data['code']]['high'], self.watch[data['code']]['buy'],
+                         (self.watch[data['code']]['current'] - self.watch[data['code']]['buy']) /
+                         self.watch[data['code']]['buy'])
+
+        else:
+            if diff:
+                # pass
+                logger.debug('[2. 추적] 종목: %s, 현재가: %s, 고가: %s, 매수가: %s, 몇프로: %s', data['code'], data['price'],
+                        self.watch[data['code']]['high'], self.watch[data['code']]['buy'],
+                        (self.watch[data['code']]['high'] - self.watch[data['code']]['current']) / self.watch[data['code']]['high'])
+
+    def checkRisk(self, code, side, qty, price):
+        """주문전 리스크 점검, 거부시 False"""
+        ok, reason = self.risk.check(self.symbols.id(code), side, qty, price)
+        if not ok:
+            logger.debug('[리스크 거부] 종목: %s, 구분: %s, 수량: %s, 가격: %s, 사유: %s', code, side, qty, price, reason)
+        return ok
+
+    def sendOrder(self, code, qty, price):
+        """주식 매수, 시장가 매수
+
+        price는 리스크 점검용 현재가
+        """
+        if not self.checkRisk(code, SIDE_BUY, qty, price):
+            return False
+
+        order = self.orders.create(self.symbols.id(code), SIDE_BUY, qty, price)
+        req_name = order.req_name
+        screen_no = "0001"
+        acct_no = self.user['accno'][0]
+        order_type = 1  # 신규매수
+        hoga_gubun = "03"  # 시장가
+
+        ret = self.kiwoom.SendOrder(req_name, screen_no, acct_no, order_type, code, qty, 0, hoga_gubun, "")
+        if ret != 0:
+            logger.error("매수주문 실패: %s", dict(code=code, ret=ret))
+            self.orders.finish(order, REJECTED)
+            return False
+        return True
+
+    def sendSell(self, code, qty, price):
+        """주식 매도, 시장가 매도
+
+        price는 리스크 점검용 현재가
+        """
+        if not self.checkRisk(code, SIDE_SELL, qty, price):
+            return False
+
+        order = self.orders.create(self.symbols.id(code), SIDE_SELL, qty, price)
+        req_name = order.req_name
+        screen_no = "0001"
+        acct_no = self.user['accno'][0]
+        order_type = 2  # 신규매도
+        hoga_gubun = "03"  # 시장가
+
+        ret = self.kiwoom.SendOrder(req_name, screen_no, acct_no, order_type, code, qty, 0, hoga_gubun, "")
+        if ret != 0:
+            logger.error("매도주문 실패: %s", dict(code=code, ret=ret))
+            self.orders.finish(order, REJECTED)
+            return False
+        return True
+
+    def OnReceiveMsg(self, sScrNo, sRQName, sTrCode, sMsg):
+        """OnReceiveMsg: 서버통신 후 메시지를 받은 시점을 알려준다.
+        입력값
+        sScrNo . 화면번호
+        sRQName . 사용자구분 명
+        sTrCode . Tran 명
+        sMsg . 서버메시지
+
+        비고
+        sScrNo . CommRqData의 sScrNo와 매핑된다.
+        sRQName . CommRqData의 sRQName 와 매핑된다.
+        sTrCode . CommRqData의 sTrCode 와 매핑된다.
+        """
+        logger.debug("-----------------------")
+        logger.debug("OnReceiveMsg: %s", dict(sScrNo=sScrNo, sRQName=sRQName, sTrCode=sTrCode, sMsg=sMsg))
+        logger.debug("화면번호: %s", sScrNo)
+        logger.debug("사용자구분명: %s", sRQName)
+        logger.debug("Tran 명: %s", sTrCode)
+        logger.debug("서버메시지: %s", sMsg)
+        logger.debug("-----------------------")
+
+        self.orders.on_msg(sRQName, sMsg)
+
+    def OnReceiveChejanData(self, sGubun, nItemCnt, sFidList):
+        """OnReceiveChejanData: 체결데이터를 받은 시점을 알려준다.
+        입력값
+        sGubun . 체결구분
+        nItemCnt - 아이템갯수
+        sFidList . 데이터리스트
+
+        비고
+        sGubun . 0:주문체결통보, 1:잔고통보, 3:특이신호
+        sFidList . 데이터 구분은 ‘;’ 이다.
+        """
+        try:
+            gubun = {"0": "주문체결통보", "1": "잔고통보", "3": "특이신호"}
+
+            logger.debug("-----------------------")
+            logger.debug("OnReceiveChejanData: %s", dict(sGubun=sGubun, nItemCnt=nItemCnt, sFidList=sFidList))
+            logger.debug("체결구분: %s", gubun[sGubun])
+
+            data = []
+            for fid in sFidList.split(";"):
+                fid_name = CODE.get_fid_msg(fid)
+                fid_data = self.kiwoom.GetChejanData(int(fid))
+                logger.debug("%s: %s", fid_name, fid_data)
+                data.append(fid_data)
+            logger.debug("-----------------------")
+
+            if sGubun == "0":
+                # 주문체결통보
+                if data[5] == "체결":
+                    self.db.insert_ord_data(data)
+                self.onChejan(data)
+
+        except Exception as e:
+            logger.exception(e, exc_info=True)
+
+    def onChejan(self, data):
+        """주문체결통보를 주문 상태와 리스크 카운터에 반영"""
+        symbol_id = self.symbols.id(data[3])
+        side = int(data[14])
+        unit_price = abs(to_int(data[22]) or 0)
+        unit_qty = abs(to_int(data[23]) or 0)
+
+        # 수수료, 세금은 주문별 누적값이므로 주문 상태에서 직전 체결과의 차이를 계산
+        order, cost = self.orders.on_chejan(symbol_id, side, data[1].strip(), data[5], to_int(data[9]),
+                                            to_int(data[18]), unit_price, unit_qty,
+                                            (to_int(data[24]) or 0) + (to_int(data[25]) or 0),
+                                            orig_ord_no=data[11].strip(), cancel="취소" in data[12])
+
+        if data[5] == "체결" and unit_qty:
+            self.risk.on_fill(symbol_id, side, unit_qty, unit_price, cost)
+
+    def onOrderClosed(self, order):
+        """주문 완료시 종목 추적 정리
+
+        - 매수 거부/취소: 미체결수량을 리스크 카운터에서 해제하고, 체결 없이 끝났으면 보유수량이 없으므로 추적 종료
+        - 매도 전량체결: 추적 종료
+        - 매도 거부/취소: 추적을 유지해서 다음 틱에 남은 보유수량을 다시 매도
+        """
+        code = self.symbols.code(order.symbol_id)
+
+        if order.side == SIDE_SELL:
+            if order.state == FILLED:
+                self.stopWatch(code)
+            else:
+                logger.info('[매도실패] 종목: %s, 주문: %s', code, order)
+            return
+
+        if order.state not in (REJECTED, CANCELLED):
+            return
+
+        self.risk.on_reject(order.symbol_id, SIDE_BUY, order.remaining, order.price)
+
+        if order.filled == 0:
+            logger.info('[매수실패] 종목: %s, 주문: %s', code, order)
+            self.stopWatch(code)
+
+    def stopWatch(self, code):
+        """추적리스트에서 삭제하고 실시간 해제, 다시 매수하지 않도록 used 에 추가"""
+        self.watch.pop(code, None)
+        if code not in self.used:
+            self.kiwoom.SetRealRemove("REAL001", code)
+            self.used.append(code)
+
+    def OnReceiveRealCondition(self, strCode, strType, strConditionName, strConditionIndex):
+        """OnReceiveRealCondition: 조건검색 실시간 편입,이탈 종목을 받을 시점을 알려준다.
+        입력값
+        LPCTSTR strCode : 종목코드
+        LPCTSTR strType : 편입(“I”), 이탈(“D”)
+        LPCTSTR strConditionName : 조건명
+        LPCTSTR strConditionIndex : 조건명 인덱스
+
+        비고
+        strConditionName에 해당하는 종목이 실시간으로 들어옴.
+        strType으로 편입된 종목인지 이탈된 종목인지 구분한다.
+        """
+        # logger.debug('OnReceiveRealCondition: %s', dict(strCode=strCode, strType=strType, strConditionName=strConditionName,
+                                                # strConditionIndex=strConditionIndex))
+        if strType == "I" and self.risk.can_open():
+            # 전일종가 기준 가격 제한폭 (하한가, 상한가)
+            symbol_id = self.symbols.id(strCode)
+            limit = self.symbols.limit(symbol_id)
+            if limit:
+                self.risk.set_limit(symbol_id, limit)
+            self.kiwoom.SetRealReg("REAL001", strCode, "10;", "1")
+
+    def OnReceiveTrCondition(self, sScrNo, strCodeList, strConditionName, nIndex, nNext):
+        """OnReceiveTrCondition: 조건검색 조회응답으로 종목리스트를 구분자(“;”)로 붙어서 받는 시점.
+        입력값
+        LPCTSTR sScrNo : 종목코드
+        LPCTSTR strCodeList : 종목리스트(“;”로 구분)
+        LPCTSTR strConditionName : 조건명
+        int nIndex : 조건명 인덱스
+        int nNext : 연속조회(2:연속조회, 0:연속조회없음)
+        """
+        logger.debug('OnReceiveTrCondition: %s',
+              dict(sScrNo=sScrNo, strCodeList=strCodeList, strConditionName=strConditionName, nIndex=nIndex,
+                   nNext=nNext))
+        try:
+            self.kiwoom.SetRealReg("REAL001", strCodeList, "10;", "0")
+        except Exception as e:
+            logger.exception(e)
+
+    def OnReceiveConditionVer(self, lRet, sMsg):
+        """로컬에 사용자 조건식 저장 성공 여부를 확인하는 시점
+        long lRet : 사용자 조건식 저장 성공여부 (1: 성공, 나머지 실패)
+        """
+        try:
+            logger.debug('OnReceiveConditionVer: %s', dict(lRet=lRet, sMsg=sMsg))
+
+            if lRet == 1:
+                condition_list = self.kiwoom.GetConditionNameList()
+                logger.info("조건검색 조회성공: %s", condition_list)
+
+                for condition in condition_list.split(';')[:-1]:
+                    index = condition.split('^')[0]
+                    name = condition.split('^')[1]
+
+                    # 실시간 조건검색 등록
+                    self.kiwoom.SendCondition(SCREEN_CONDITION_SEARCH, name, int(index), 1)
+            else:
+                logger.error("조건검색 조회실패: %s", dict(lRet=lRet, sMsg=sMsg))
+        except Exception as e:
+            logger.exception(e)